@@ -1,6 +1,9 @@
+import bisect
 import json
 import os
+import threading
 import time
+from collections import deque
 from web3 import Web3
 from dotenv import load_dotenv
 from flask import Flask, jsonify, request, render_template_string, session
@@ -10,10 +13,509 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = 'blockchain_demo_secret_key_2024'
 
+# Gas de uma transferência simples de ETH para uma conta externa
+GAS_TRANSFERENCIA = 21000
+
+class RegistroContas:
+    """Registro de todas as contas criadas ou vistas pela aplicação.
+
+    Mantém um índice de saldos atualizado incrementalmente a partir dos blocos
+    minerados: apenas as contas tocadas por um bloco novo têm o saldo consultado.
+    Os índices ordenados permitem paginação por cursor sem varrer todas as contas.
+    Por padrão o registro acompanha a cadeia a partir do bloco atual; com
+    ``REGISTRO_BLOCO_INICIAL`` os blocos anteriores são reprocessados, sem que
+    um saldo antigo sobrescreva outro obtido em um bloco mais recente.
+    """
+
+    ORDENACOES = ('saldo', 'atividade')
+
+    def __init__(self, w3):
+        self.w3 = w3
+        self.lock = threading.Lock()
+        self.contas = {}
+        self.indices = {ordenacao: [] for ordenacao in self.ORDENACOES}
+        bloco_inicial = os.getenv('REGISTRO_BLOCO_INICIAL')
+        if bloco_inicial:
+            self.ultimo_bloco = int(bloco_inicial) - 1
+        else:
+            self.ultimo_bloco = w3.eth.block_number
+        self.blocos_por_ciclo = int(os.getenv('REGISTRO_BLOCOS_POR_CICLO', '100'))
+
+    def _chave(self, ordenacao, conta):
+        """Chave de ordenação (decrescente) de uma conta em um índice"""
+        if ordenacao == 'saldo':
+            return (-conta['balance_wei'], conta['address'])
+        return (-conta['transacoes'], conta['address'])
+
+    def _remover_dos_indices(self, conta):
+        for ordenacao, indice in self.indices.items():
+            chave = self._chave(ordenacao, conta)
+            posicao = bisect.bisect_left(indice, chave)
+            if posicao < len(indice) and indice[posicao] == chave:
+                del indice[posicao]
+
+    def _inserir_nos_indices(self, conta):
+        for ordenacao, indice in self.indices.items():
+            bisect.insort(indice, self._chave(ordenacao, conta))
+
+    def _atualizar(self, endereco, saldo_wei=None, bloco_saldo=None, transacoes=0, bloco=None):
+        """Cria ou atualiza uma conta, mantendo os índices ordenados.
+
+        ``bloco_saldo`` é o bloco em que ``saldo_wei`` foi lido; saldos de blocos
+        anteriores ao do saldo já conhecido são ignorados.
+        """
+        conta = self.contas.get(endereco)
+        if conta is None:
+            conta = {'address': endereco, 'balance_wei': 0, 'bloco_saldo': -1,
+                     'transacoes': 0, 'ultimo_bloco': None}
+            self.contas[endereco] = conta
+        else:
+            self._remover_dos_indices(conta)
+
+        if saldo_wei is not None and bloco_saldo >= conta['bloco_saldo']:
+            conta['balance_wei'] = saldo_wei
+            conta['bloco_saldo'] = bloco_saldo
+        conta['transacoes'] += transacoes
+        if bloco is not None and (conta['ultimo_bloco'] is None or bloco > conta['ultimo_bloco']):
+            conta['ultimo_bloco'] = bloco
+
+        self._inserir_nos_indices(conta)
+
+    def registrar(self, endereco, saldo_wei=None, bloco_saldo=None):
+        """Registra uma conta conhecida pela aplicação (ex.: recém-criada)"""
+        endereco = self.w3.to_checksum_address(endereco)
+        if saldo_wei is None:
+            if endereco in self.contas:
+                return
+            bloco_saldo = self.w3.eth.block_number
+            saldo_wei = self.w3.eth.get_balance(endereco, bloco_saldo)
+        with self.lock:
+            self._atualizar(endereco, saldo_wei=saldo_wei, bloco_saldo=bloco_saldo)
+
+    def processar_bloco(self, numero_bloco):
+        """Atualiza o índice com as contas movimentadas em um bloco"""
+        bloco = self.w3.eth.get_block(numero_bloco, full_transactions=True)
+
+        atividade = {}
+        for transacao in bloco.transactions:
+            for endereco in (transacao['from'], transacao.get('to')):
+                if endereco:
+                    atividade[endereco] = atividade.get(endereco, 0) + 1
+        if bloco.miner:
+            atividade.setdefault(bloco.miner, 0)
+
+        # Consultar saldos fora do lock para não bloquear as leituras
+        saldos = {endereco: self.w3.eth.get_balance(endereco, numero_bloco) for endereco in atividade}
+
+        with self.lock:
+            for endereco, transacoes in atividade.items():
+                self._atualizar(endereco, saldo_wei=saldos[endereco], bloco_saldo=numero_bloco,
+                                transacoes=transacoes, bloco=numero_bloco)
+            self.ultimo_bloco = numero_bloco
+
+    def sincronizar(self, bloco_atual):
+        """Processa os blocos ainda não vistos até bloco_atual.
+
+        Cada chamada processa no máximo ``blocos_por_ciclo`` blocos, para que a
+        carga inicial de uma cadeia longa não atrase o restante do monitoramento.
+        """
+        ultimo = min(bloco_atual, self.ultimo_bloco + self.blocos_por_ciclo)
+        for numero_bloco in range(self.ultimo_bloco + 1, ultimo + 1):
+            self.processar_bloco(numero_bloco)
+
+    def listar(self, ordenacao='saldo', limite=20, cursor=None):
+        """Retorna uma página de contas ordenada e o cursor da próxima página.
+
+        O cursor é a chave da última conta entregue (``valor:endereco``), de modo
+        que a página seguinte é localizada por busca binária no índice.
+        """
+        if ordenacao not in self.ORDENACOES:
+            raise ValueError(f"Ordenação inválida: use {', '.join(self.ORDENACOES)}")
+        if limite < 1:
+            raise ValueError("Limite deve ser maior que zero")
+
+        with self.lock:
+            indice = self.indices[ordenacao]
+            inicio = 0
+            if cursor:
+                try:
+                    valor, endereco = cursor.split(':', 1)
+                    inicio = bisect.bisect_right(indice, (-int(valor), endereco))
+                except ValueError:
+                    raise ValueError("Cursor inválido")
+
+            chaves = indice[inicio:inicio + limite]
+            pagina = []
+            for _, endereco in chaves:
+                conta = self.contas[endereco]
+                pagina.append({
+                    'address': endereco,
+                    'balance_ether': conta['balance_wei'] / 10**18,
+                    'balance_wei': conta['balance_wei'],
+                    'transacoes': conta['transacoes'],
+                    'ultimo_bloco': conta['ultimo_bloco']
+                })
+
+            proximo_cursor = None
+            if inicio + limite < len(indice):
+                valor, endereco = chaves[-1]
+                proximo_cursor = f"{-valor}:{endereco}"
+
+            return {
+                'contas': pagina,
+                'ordenacao': ordenacao,
+                'total': len(self.contas),
+                'proximo_cursor': proximo_cursor
+            }
+
+class OraculoTaxas:
+    """Oráculo de taxas baseado em uma janela móvel de ``eth_feeHistory``.
+
+    A janela é atualizada uma vez por bloco novo, buscando apenas os blocos que
+    faltam; as sugestões de taxa são calculadas a partir dela sem chamadas RPC.
+    Em nós sem EIP-1559, detectados uma única vez na criação, o oráculo recorre
+    ao ``gasPrice`` legado, também consultado uma vez por bloco.
+    """
+
+    URGENCIAS = {'baixa': 10, 'media': 50, 'alta': 90}
+    PRIORIDADE_PADRAO = 10**9  # 1 Gwei, usado enquanto não há recompensas na janela
+
+    def __init__(self, w3):
+        self.w3 = w3
+        self.lock = threading.Lock()
+        self.janela = deque(maxlen=int(os.getenv('JANELA_HISTORICO_TAXAS', '20')))
+        self.suporta_eip1559 = self._detectar_eip1559()
+        self.proximo_base_fee = 0
+        self.gas_price = 0
+        self.ultimo_bloco = -1
+
+    def _detectar_eip1559(self):
+        """Verifica se o nó tem base fee e responde a ``eth_feeHistory``"""
+        try:
+            if 'baseFeePerGas' not in self.w3.eth.get_block('latest'):
+                return False
+            self.w3.eth.fee_history(1, 'latest', [])
+            return True
+        except Exception:
+            return False
+
+    def atualizar(self, bloco_atual):
+        """Incorpora à janela os blocos minerados desde a última atualização.
+
+        Em caso de erro no nó a janela e o modo atuais são mantidos e os mesmos
+        blocos são pedidos de novo na próxima atualização.
+        """
+        if bloco_atual <= self.ultimo_bloco:
+            return
+
+        if not self.suporta_eip1559:
+            try:
+                gas_price = self.w3.eth.gas_price
+            except Exception as e:
+                print(f"⚠️ Erro ao consultar o gas price: {e}")
+                return
+            with self.lock:
+                self.gas_price = gas_price
+                self.ultimo_bloco = bloco_atual
+            return
+
+        quantidade = min(bloco_atual - self.ultimo_bloco, self.janela.maxlen)
+        percentis = list(self.URGENCIAS.values())
+        try:
+            historico = self.w3.eth.fee_history(quantidade, bloco_atual, percentis)
+        except Exception as e:
+            print(f"⚠️ Erro ao consultar o histórico de taxas: {e}")
+            return
+        base_fees = historico['baseFeePerGas']
+
+        recompensas = historico.get('reward') or [[] for _ in range(quantidade)]
+        uso_gas = historico.get('gasUsedRatio') or [0] * len(recompensas)
+        with self.lock:
+            for recompensa, uso in zip(recompensas, uso_gas):
+                # Blocos vazios relatam gorjeta zero e derrubariam a mediana
+                if uso and any(recompensa):
+                    self.janela.append(dict(zip(self.URGENCIAS, recompensa)))
+            # O último item é a base fee prevista para o próximo bloco
+            self.proximo_base_fee = base_fees[-1]
+            self.ultimo_bloco = bloco_atual
+
+    def sugerir(self, urgencia='media'):
+        """Retorna os campos de taxa de uma transação para a urgência pedida"""
+        if urgencia not in self.URGENCIAS:
+            raise ValueError(f"Urgência inválida: use {', '.join(self.URGENCIAS)}")
+
+        with self.lock:
+            if not self.suporta_eip1559:
+                return {'gasPrice': self.gas_price}
+
+            amostras = sorted(bloco[urgencia] for bloco in self.janela)
+            prioridade = amostras[len(amostras) // 2] if amostras else self.PRIORIDADE_PADRAO
+            return {
+                'type': 2,
+                # Margem de duas base fees cobre seis blocos cheios seguidos
+                'maxFeePerGas': 2 * self.proximo_base_fee + prioridade,
+                'maxPriorityFeePerGas': prioridade
+            }
+
+    def preco_gas(self):
+        """Preço de gas de referência em wei (base fee prevista + gorjeta média)"""
+        taxas = self.sugerir()
+        if 'gasPrice' in taxas:
+            return taxas['gasPrice']
+        return self.proximo_base_fee + taxas['maxPriorityFeePerGas']
+
+    def custo_maximo(self, gas, taxas):
+        """Custo máximo em wei de uma transação com as taxas sugeridas"""
+        return gas * taxas.get('maxFeePerGas', taxas.get('gasPrice', 0))
+
+class RastreadorPendentes:
+    """Visão em memória das transações pendentes (mempool) da rede.
+
+    Acompanha as novas transações por um único filtro no nó
+    (``eth_newPendingTransactionFilter``) e as indexa por remetente e por
+    destinatário. As transações saem da visão quando aparecem em um bloco,
+    quando o nonce confirmado do remetente as ultrapassa (mineradas ou
+    substituídas) ou quando ficam mais de ``ttl`` segundos sem confirmação.
+    """
+
+    def __init__(self, w3):
+        self.w3 = w3
+        self.lock = threading.Lock()
+        self.filtro = None
+        self.ultimo_bloco = None
+        self.ttl = float(os.getenv('PENDENTES_TTL', '600'))
+        self.transacoes = {}
+        self.por_remetente = {}
+        self.por_destinatario = {}
+        self.nonces_confirmados = {}
+
+    def atualizar(self, bloco_atual):
+        """Busca no filtro as transações pendentes surgidas desde a última consulta
+        e retira da visão as mineradas nos blocos novos até bloco_atual"""
+        try:
+            if self.filtro is None:
+                self.filtro = self.w3.eth.filter('pending')
+            novos_hashes = self.filtro.get_new_entries()
+        except Exception as e:
+            # Filtros expiram no nó após um período sem consulta; recriar na próxima rodada
+            print(f"⚠️ Filtro de transações pendentes indisponível: {e}")
+            self.filtro = None
+            novos_hashes = []
+
+        for tx_hash in novos_hashes:
+            if Web3.to_hex(tx_hash) in self.transacoes:
+                continue
+            try:
+                transacao = self.w3.eth.get_transaction(tx_hash)
+            except Exception:
+                continue  # Descartada ou substituída antes da consulta
+            if transacao.blockNumber is None:
+                self.adicionar(transacao)
+
+        nonces_minerados = self.processar_minerados(bloco_atual)
+        self.expurgar(nonces_minerados)
+
+    def processar_minerados(self, bloco_atual):
+        """Retira da visão as transações dos blocos minerados desde a última rodada.
+
+        Acompanha a ponta da cadeia por conta própria, independente da carga do
+        registro de contas, e avança bloco a bloco para não perder hashes se a
+        leitura de um bloco falhar. Retorna o nonce confirmado de cada remetente
+        visto nos blocos novos, ou None se nenhum bloco novo foi minerado.
+        """
+        if self.ultimo_bloco is None:
+            self.ultimo_bloco = bloco_atual
+            return None
+        if bloco_atual <= self.ultimo_bloco:
+            return None
+
+        nonces = {}
+        for numero_bloco in range(self.ultimo_bloco + 1, bloco_atual + 1):
+            bloco = self.w3.eth.get_block(numero_bloco, full_transactions=True)
+            for transacao in bloco.transactions:
+                remetente = transacao['from']
+                nonces[remetente] = max(nonces.get(remetente, 0), transacao['nonce'] + 1)
+            self.remover(transacao['hash'] for transacao in bloco.transactions)
+            self.ultimo_bloco = numero_bloco
+        return nonces
+
+    def expurgar(self, nonces_minerados=None):
+        """Descarta transações já superadas pelo nonce do remetente ou expiradas.
+
+        Nonces confirmados só mudam com blocos novos: sem eles (``nonces_minerados``
+        None) apenas o prazo de ``ttl`` é verificado. Com blocos novos, o nó só é
+        consultado pelos remetentes pendentes que não apareceram nesses blocos e
+        cujo nonce ainda não é conhecido.
+        """
+        nonces = dict(nonces_minerados or {})
+        if nonces_minerados is not None:
+            with self.lock:
+                remetentes = [
+                    remetente for remetente in self.por_remetente
+                    if remetente not in nonces and remetente not in self.nonces_confirmados
+                ]
+            for remetente in remetentes:
+                try:
+                    nonces[remetente] = self.w3.eth.get_transaction_count(remetente)
+                except Exception:
+                    continue
+
+        limite = time.time() - self.ttl
+        with self.lock:
+            for remetente, nonce in nonces.items():
+                self.nonces_confirmados[remetente] = max(nonce, self.nonces_confirmados.get(remetente, 0))
+            obsoletas = [
+                tx_hash for tx_hash, transacao in self.transacoes.items()
+                if transacao['visto_em'] < limite or self._superada(transacao)
+            ]
+            self._remover(obsoletas)
+            # Manter só os nonces de remetentes que ainda têm transações pendentes
+            self.nonces_confirmados = {
+                remetente: nonce for remetente, nonce in self.nonces_confirmados.items()
+                if remetente in self.por_remetente
+            }
+
+    def _superada(self, transacao):
+        """Indica se o nonce confirmado do remetente já passou o da transação"""
+        return transacao['nonce'] < self.nonces_confirmados.get(transacao['from'], 0)
+
+    def adicionar(self, transacao):
+        """Indexa uma transação pendente (da rede ou enviada pela aplicação)"""
+        tx_hash = Web3.to_hex(transacao['hash'])
+        remetente = Web3.to_checksum_address(transacao['from'])
+        destinatario = transacao.get('to')
+        if destinatario:
+            destinatario = Web3.to_checksum_address(destinatario)
+        taxa_maxima = transacao.get('maxFeePerGas') or transacao.get('gasPrice') or 0
+
+        with self.lock:
+            self.transacoes[tx_hash] = {
+                'hash': tx_hash,
+                'from': remetente,
+                'to': destinatario,
+                'value_wei': transacao['value'],
+                'value_ether': transacao['value'] / 10**18,
+                'nonce': transacao['nonce'],
+                'gas': transacao['gas'],
+                'taxa_maxima': taxa_maxima,
+                'gorjeta': transacao.get('maxPriorityFeePerGas'),
+                'custo_maximo_gas': transacao['gas'] * taxa_maxima,
+                'visto_em': time.time()
+            }
+            self.por_remetente.setdefault(remetente, set()).add(tx_hash)
+            if destinatario:
+                self.por_destinatario.setdefault(destinatario, set()).add(tx_hash)
+
+    def remover(self, hashes):
+        """Retira da visão as transações já mineradas"""
+        with self.lock:
+            self._remover([Web3.to_hex(tx_hash) for tx_hash in hashes])
+
+    def _remover(self, hashes):
+        for tx_hash in hashes:
+            transacao = self.transacoes.pop(tx_hash, None)
+            if transacao is None:
+                continue
+            for indice, endereco in ((self.por_remetente, transacao['from']),
+                                     (self.por_destinatario, transacao['to'])):
+                hashes_endereco = indice.get(endereco)
+                if hashes_endereco is not None:
+                    hashes_endereco.discard(transacao['hash'])
+                    if not hashes_endereco:
+                        del indice[endereco]
+
+    def listar(self, endereco=None):
+        """Lista as transações pendentes, opcionalmente só as de um endereço"""
+        with self.lock:
+            if endereco is None:
+                return list(self.transacoes.values())
+            hashes = self.por_remetente.get(endereco, set()) | self.por_destinatario.get(endereco, set())
+            return [self.transacoes[tx_hash] for tx_hash in hashes]
+
+    def contar(self, endereco):
+        """Quantidade de transações pendentes enviadas e recebidas por um endereço"""
+        with self.lock:
+            return {
+                'enviadas': len(self.por_remetente.get(endereco, ())),
+                'recebidas': len(self.por_destinatario.get(endereco, ()))
+            }
+
+    def _custo_esperado(self, transacao, base_fee):
+        """Custo de gas esperado: base fee prevista + gorjeta, limitado à taxa máxima"""
+        if transacao['gorjeta'] is None:
+            return transacao['gas'] * transacao['taxa_maxima']
+        return transacao['gas'] * min(transacao['taxa_maxima'], base_fee + transacao['gorjeta'])
+
+    def ajustar(self, endereco, saldo_wei, nonce, base_fee=0):
+        """Aplica as transações pendentes ao saldo e ao nonce confirmados.
+
+        Das transações enviadas é descontado o custo de gas esperado com a base
+        fee prevista ``base_fee``, e não o máximo que a transação autoriza.
+        Transações, enviadas ou recebidas, cujo nonce está abaixo do confirmado
+        do remetente já foram mineradas ou substituídas: são descartadas em vez
+        de contadas duas vezes no saldo.
+        """
+        with self.lock:
+            self.nonces_confirmados[endereco] = nonce
+            hashes = self.por_remetente.get(endereco, set()) | self.por_destinatario.get(endereco, set())
+            self._remover([
+                tx_hash for tx_hash in hashes if self._superada(self.transacoes[tx_hash])
+            ])
+
+            for tx_hash in self.por_remetente.get(endereco, ()):
+                transacao = self.transacoes[tx_hash]
+                saldo_wei -= transacao['value_wei'] + self._custo_esperado(transacao, base_fee)
+                nonce = max(nonce, transacao['nonce'] + 1)
+            for tx_hash in self.por_destinatario.get(endereco, ()):
+                saldo_wei += self.transacoes[tx_hash]['value_wei']
+        return saldo_wei, nonce
+
 class BlockchainApp:
     def __init__(self):
         self.connect_to_blockchain()
-    
+        self.registro = RegistroContas(self.w3)
+        self.oraculo = OraculoTaxas(self.w3)
+        self.pendentes = RastreadorPendentes(self.w3)
+        self.oraculo.atualizar(self.w3.eth.block_number)
+        for conta in self.get_accounts():
+            self.registro.registrar(conta)
+        self.iniciar_monitoramento()
+
+    def iniciar_monitoramento(self):
+        """Inicia a thread que acompanha os novos blocos da rede"""
+        intervalo = float(os.getenv('INTERVALO_SINCRONIZACAO', '2'))
+
+        def monitorar():
+            while True:
+                self.sincronizar()
+                time.sleep(intervalo)
+
+        threading.Thread(target=monitorar, daemon=True).start()
+
+    def sincronizar(self):
+        """Processa os blocos minerados desde a última sincronização"""
+        try:
+            bloco_atual = self.w3.eth.block_number
+        except Exception as e:
+            print(f"⚠️ Erro ao obter o bloco atual: {e}")
+            return
+        
+        # Cada componente trata seus erros para que a falha de um não atrase os outros
+        try:
+            self.oraculo.atualizar(bloco_atual)
+        except Exception as e:
+            print(f"⚠️ Erro ao atualizar o oráculo de taxas: {e}")
+        
+        try:
+            self.pendentes.atualizar(bloco_atual)
+        except Exception as e:
+            print(f"⚠️ Erro ao atualizar as transações pendentes: {e}")
+        
+        try:
+            self.registro.sincronizar(bloco_atual)
+        except Exception as e:
+            print(f"⚠️ Erro ao sincronizar o registro de contas: {e}")
+
     def connect_to_blockchain(self):
         """Conecta à rede blockchain com retry automático"""
         ganache_url = os.getenv('GANACHE_URL', 'http://ganache:8545')
@@ -28,7 +530,8 @@ class BlockchainApp:
                 if self.w3.is_connected():
                     print("✅ Conectado à blockchain Ethereum local")
                     print(f"📊 Saldo total da rede: {self.w3.eth.get_balance(self.w3.eth.accounts[0]) / 10**18} ETH")
-                    print(f"🔗 Chain ID: {self.w3.eth.chain_id}")
+                    self.chain_id = self.w3.eth.chain_id
+                    print(f"🔗 Chain ID: {self.chain_id}")
                     print(f"⛽ Gas Price: {self.w3.eth.gas_price / 10**9} Gwei")
                     return
                 else:
@@ -68,9 +571,9 @@ class BlockchainApp:
                 'from': conta_principal,
                 'to': endereco,
                 'value': saldo_wei,
-                'gas': 21000,
-                'gasPrice': self.w3.eth.gas_price,
-                'chainId': self.w3.eth.chain_id
+                'gas': GAS_TRANSFERENCIA,
+                'chainId': self.chain_id,
+                **self.oraculo.sugerir()
             }
             
             # Usar a chave privada do Ganache (determinística)
@@ -80,7 +583,10 @@ class BlockchainApp:
             
             # CORREÇÃO: Usar raw_transaction em vez de rawTransaction
             tx_hash = self.w3.eth.send_raw_transaction(transacao_assinada.raw_transaction)
+            self.pendentes.adicionar({**transacao, 'from': conta_principal, 'hash': tx_hash})
             recibo = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            self.pendentes.remover([tx_hash])
+            self.registro.registrar(endereco, saldo_wei, recibo.blockNumber)
             
             return True, {
                 'endereco': endereco,
@@ -101,27 +607,6 @@ class BlockchainApp:
             print(f"Erro ao obter contas: {e}")
             return []
 
-    def get_accounts_with_balances(self):
-        """Retorna contas com seus saldos"""
-        accounts = self.get_accounts()
-        accounts_info = []
-        for account in accounts:
-            try:
-                balance = self.w3.eth.get_balance(account)
-                accounts_info.append({
-                    'address': account,
-                    'balance_ether': balance / 10**18,
-                    'balance_wei': balance
-                })
-            except Exception as e:
-                print(f"Erro ao obter saldo para {account}: {e}")
-                accounts_info.append({
-                    'address': account,
-                    'balance_ether': 0,
-                    'balance_wei': 0
-                })
-        return accounts_info
-
     def cadastrar_usuario(self, endereco, saldo_inicial=10):
         """Cadastra um novo usuário com saldo inicial"""
         try:
@@ -149,9 +634,9 @@ class BlockchainApp:
                 'from': conta_principal,
                 'to': endereco,
                 'value': saldo_wei,
-                'gas': 21000,
-                'gasPrice': self.w3.eth.gas_price,
-                'chainId': self.w3.eth.chain_id
+                'gas': GAS_TRANSFERENCIA,
+                'chainId': self.chain_id,
+                **self.oraculo.sugerir()
             }
             
             # Usar a chave privada do Ganache (determinística)
@@ -161,7 +646,10 @@ class BlockchainApp:
             
             # CORREÇÃO: Usar raw_transaction em vez de rawTransaction
             tx_hash = self.w3.eth.send_raw_transaction(transacao_assinada.raw_transaction)
+            self.pendentes.adicionar({**transacao, 'from': conta_principal, 'hash': tx_hash})
             recibo = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            self.pendentes.remover([tx_hash])
+            self.registro.registrar(endereco, saldo_wei, recibo.blockNumber)
             
             return True, {
                 'message': 'Usuário cadastrado com sucesso!',
@@ -180,20 +668,28 @@ class BlockchainApp:
             return False, "Endereço inválido"
         
         try:
+            endereco = self.w3.to_checksum_address(endereco)
             saldo = self.w3.eth.get_balance(endereco)
             transacao_count = self.w3.eth.get_transaction_count(endereco)
             
+            # Considerar as transações em trânsito sem novas chamadas ao nó
+            saldo_pendente, nonce_pendente = self.pendentes.ajustar(
+                endereco, saldo, transacao_count, self.oraculo.proximo_base_fee)
+            
             return True, {
                 'endereco': endereco,
-                'saldo_ether': saldo / 10**18,
-                'saldo_wei': saldo,
-                'nonce': transacao_count,
+                'saldo_ether': saldo_pendente / 10**18,
+                'saldo_wei': saldo_pendente,
+                'saldo_confirmado_wei': saldo,
+                'nonce': nonce_pendente,
+                'nonce_confirmado': transacao_count,
+                'pendentes': self.pendentes.contar(endereco),
                 'is_contract': len(self.w3.eth.get_code(endereco)) > 2  # '0x' + bytes
             }
         except Exception as e:
             return False, f"Erro no login: {str(e)}"
     
-    def transferir(self, remetente_privada, destinatario, valor_ether):
+    def transferir(self, remetente_privada, destinatario, valor_ether, urgencia='media'):
         """Realiza transferência entre contas"""
         try:
             if not self.w3.is_address(destinatario):
@@ -201,12 +697,24 @@ class BlockchainApp:
             
             conta_remetente = self.w3.eth.account.from_key(remetente_privada).address
             valor_wei = self.w3.to_wei(valor_ether, 'ether')
+            taxas = self.oraculo.sugerir(urgencia)
             
             # Verificar saldo do remetente
             saldo_remetente = self.w3.eth.get_balance(conta_remetente)
-            custo_gas = 21000 * self.w3.eth.gas_price
+            if saldo_remetente < (valor_wei + self.oraculo.custo_maximo(GAS_TRANSFERENCIA, taxas)):
+                return False, "Saldo insuficiente para transferência + gas"
+            
+            # Destinatários que são contratos podem consumir mais que uma transferência simples
+            try:
+                gas = self.w3.eth.estimate_gas({
+                    'from': conta_remetente,
+                    'to': destinatario,
+                    'value': valor_wei
+                })
+            except Exception as e:
+                return False, f"Não foi possível estimar o gas da transferência: {str(e)}"
             
-            if saldo_remetente < (valor_wei + custo_gas):
+            if saldo_remetente < (valor_wei + self.oraculo.custo_maximo(gas, taxas)):
                 return False, "Saldo insuficiente para transferência + gas"
             
             nonce = self.w3.eth.get_transaction_count(conta_remetente)
@@ -215,16 +723,18 @@ class BlockchainApp:
                 'nonce': nonce,
                 'to': destinatario,
                 'value': valor_wei,
-                'gas': 21000,
-                'gasPrice': self.w3.eth.gas_price,
-                'chainId': self.w3.eth.chain_id
+                'gas': gas,
+                'chainId': self.chain_id,
+                **taxas
             }
             
             transacao_assinada = self.w3.eth.account.sign_transaction(transacao, remetente_privada)
             
             # CORREÇÃO: Usar raw_transaction em vez de rawTransaction
             tx_hash = self.w3.eth.send_raw_transaction(transacao_assinada.raw_transaction)
+            self.pendentes.adicionar({**transacao, 'from': conta_remetente, 'hash': tx_hash})
             recibo = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            self.pendentes.remover([tx_hash])
             
             return True, {
                 'hash_transacao': tx_hash.hex(),
@@ -234,6 +744,7 @@ class BlockchainApp:
                 'to': destinatario,
                 'value_ether': valor_ether,
                 'gas_used': recibo.gasUsed,
+                'effective_gas_price': recibo.get('effectiveGasPrice'),
                 'transaction_index': recibo.transactionIndex
             }
             
@@ -281,6 +792,10 @@ class BlockchainApp:
         except Exception as e:
             return {'error': f"Erro ao obter transação: {str(e)}"}
     
+    def obter_taxas(self):
+        """Retorna as taxas sugeridas pelo oráculo para cada urgência"""
+        return {urgencia: self.oraculo.sugerir(urgencia) for urgencia in OraculoTaxas.URGENCIAS}
+
     def obter_estatisticas(self):
         """Retorna estatísticas da rede"""
         try:
@@ -288,8 +803,9 @@ class BlockchainApp:
             return {
                 'block_number': ultimo_bloco.number,
                 'total_accounts': len(self.w3.eth.accounts),
-                'gas_price': self.w3.eth.gas_price,
-                'chain_id': self.w3.eth.chain_id,
+                'gas_price': self.oraculo.preco_gas(),
+                'taxas_sugeridas': self.obter_taxas(),
+                'chain_id': self.chain_id,
                 'is_mining': True,  # Ganache sempre está minerando
                 'latest_block_timestamp': ultimo_bloco.timestamp,
                 'gas_limit': ultimo_bloco.gasLimit
@@ -323,7 +839,7 @@ HTML_TEMPLATE = '''
         button.secondary:hover { background: #7f8c8d; }
         button.success { background: #27ae60; }
         button.success:hover { background: #219653; }
-        input, textarea { width: 100%; padding: 10px; margin: 8px 0; border: 1px solid #ddd; border-radius: 5px; font-size: 16px; }
+        input, textarea, select { width: 100%; padding: 10px; margin: 8px 0; border: 1px solid #ddd; border-radius: 5px; font-size: 16px; }
         .success { color: #27ae60; background: #d5f4e6; padding: 10px; border-radius: 5px; margin: 10px 0; }
         .error { color: #e74c3c; background: #fadbd8; padding: 10px; border-radius: 5px; margin: 10px 0; }
         .warning { color: #f39c12; background: #fef5e7; padding: 10px; border-radius: 5px; margin: 10px 0; }
@@ -354,6 +870,8 @@ HTML_TEMPLATE = '''
             <p><strong>Endereço:</strong> {{ session.get('usuario_endereco') }}</p>
             <p><strong>Saldo:</strong> {{ "%.6f"|format(session.get('usuario_saldo', 0)) }} ETH</p>
             <p><strong>Nonce:</strong> {{ session.get('usuario_nonce', 0) }}</p>
+            {% set pendentes = session.get('usuario_pendentes', {}) %}
+            <p><strong>Pendentes:</strong> {{ pendentes.get('enviadas', 0) }} enviadas, {{ pendentes.get('recebidas', 0) }} recebidas</p>
         </div>
         {% else %}
         <div class="warning">
@@ -406,6 +924,11 @@ HTML_TEMPLATE = '''
                 <textarea name="remetente_privada" placeholder="Chave privada do remetente (0x...)" required rows="3"></textarea>
                 <input type="text" name="destinatario" placeholder="Endereço do destinatário (0x...)" required>
                 <input type="number" name="valor" placeholder="Valor em ETH" step="0.001" min="0.001" required>
+                <select name="urgencia">
+                    <option value="baixa">🐢 Urgência baixa</option>
+                    <option value="media" selected>⚖️ Urgência média</option>
+                    <option value="alta">⚡ Urgência alta</option>
+                </select>
                 <button type="submit" class="success">🚀 Realizar Transferência</button>
             </form>
             <div id="transferencia-resultado"></div>
@@ -610,7 +1133,7 @@ def index():
     
     try:
         estatisticas = blockchain.obter_estatisticas()
-        accounts = blockchain.get_accounts_with_balances()
+        accounts = blockchain.registro.listar(limite=50)['contas']
         
         # Atualizar informações da sessão se o usuário estiver logado
         if session.get('usuario_logado'):
@@ -618,6 +1141,7 @@ def index():
             if sucesso:
                 session['usuario_saldo'] = info_usuario['saldo_ether']
                 session['usuario_nonce'] = info_usuario['nonce']
+                session['usuario_pendentes'] = info_usuario['pendentes']
         
         return render_template_string(HTML_TEMPLATE, 
                                    estatisticas=estatisticas, 
@@ -649,6 +1173,7 @@ def login():
         session['usuario_endereco'] = endereco
         session['usuario_saldo'] = resultado['saldo_ether']
         session['usuario_nonce'] = resultado['nonce']
+        session['usuario_pendentes'] = resultado['pendentes']
     
     return jsonify({'success': sucesso, 'result': resultado})
 
@@ -665,7 +1190,8 @@ def transferir():
     remetente_privada = request.form['remetente_privada']
     destinatario = request.form['destinatario']
     valor = float(request.form['valor'])
-    sucesso, resultado = blockchain.transferir(remetente_privada, destinatario, valor)
+    urgencia = request.form.get('urgencia', 'media')
+    sucesso, resultado = blockchain.transferir(remetente_privada, destinatario, valor, urgencia)
     return jsonify({'success': sucesso, 'result': resultado})
 
 @app.route('/bloco', methods=['POST'])
@@ -689,11 +1215,48 @@ def estatisticas():
         return jsonify({'error': 'Blockchain não disponível'})
     return jsonify(blockchain.obter_estatisticas())
 
+@app.route('/taxas')
+def taxas():
+    if not blockchain:
+        return jsonify({'error': 'Blockchain não disponível'})
+    return jsonify(blockchain.obter_taxas())
+
+@app.route('/pendentes')
+def pendentes():
+    if not blockchain:
+        return jsonify({'error': 'Blockchain não disponível'})
+    
+    endereco = request.args.get('endereco')
+    if endereco is not None:
+        if not blockchain.w3.is_address(endereco):
+            return jsonify({'error': 'Endereço inválido'}), 400
+        endereco = blockchain.w3.to_checksum_address(endereco)
+    
+    transacoes = blockchain.pendentes.listar(endereco)
+    return jsonify({'transacoes': transacoes, 'total': len(transacoes)})
+
+@app.route('/pendentes/<endereco>/contagem')
+def pendentes_contagem(endereco):
+    if not blockchain:
+        return jsonify({'error': 'Blockchain não disponível'})
+    if not blockchain.w3.is_address(endereco):
+        return jsonify({'error': 'Endereço inválido'}), 400
+    return jsonify(blockchain.pendentes.contar(blockchain.w3.to_checksum_address(endereco)))
+
 @app.route('/contas')
 def contas():
     if not blockchain:
         return jsonify({'error': 'Blockchain não disponível'})
-    return jsonify(blockchain.get_accounts_with_balances())
+    
+    try:
+        pagina = blockchain.registro.listar(
+            ordenacao=request.args.get('ordenar', 'saldo'),
+            limite=min(int(request.args.get('limite', 20)), 100),
+            cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(pagina)
 
 @app.route('/health')
 def health():